@@ -32,7 +32,8 @@
 from pprint import pprint
 
 import numpy as np
-import matplotlib.pyplot as plt
+
+# matplotlib is only imported when verbose plotting is requested
 
 # import scipy
 # import scipy.signal
@@ -161,6 +162,7 @@ def filter_large_changes(sig, valid, tm, max_change=25, w=8, verbose=False):
         return sig, valid
 
     if verbose:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12, 0.75))
         plt.title('new filter_large_changes: Invalid')
         plt.plot(tm, change_mask)
@@ -178,6 +180,7 @@ def get_valid_segments(orig_hr, ts, recno, max_change=25, verbose=False, verbose
     """Returns valid segments ordered by error rate"""
 
     if verbose:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12, 2))
         plt.title('{}: Full Recording (orig)'.format(recno))
         plt.plot(ts / 60, orig_hr)
@@ -228,8 +231,8 @@ def get_valid_segments(orig_hr, ts, recno, max_change=25, verbose=False, verbose
              'seg_ts': seg_ts,
              'orig_seg_hr': orig_hr[seg_start:seg_end],
              'mask': mask,
-             'pct_valid': np.mean(mask)
-
+             'pct_valid': np.mean(mask),
+             'i_start': i_start,    # seg_start/seg_end are relative to stable start of recording
              })
 
     selected_segments = sorted(selected_segments, key=lambda x: -x['pct_valid'])
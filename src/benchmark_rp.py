@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+#
+# Benchmark exact vs approximate (KD-tree) Recurrence Plots across segment lengths
+#
+# Usage:  python benchmark_rp.py
+#
+
+import time
+
+import numpy as np
+
+from libRP import compute_rp, compute_rp_approx, mask_knn, rp_norm, rp_jaccard, delay_embedding
+
+
+def synthetic_hr(n, seed=0):
+    """Random walk heart rate signal, roughly resembling decimated FHR"""
+    rng = np.random.RandomState(seed)
+    return 140 + np.cumsum(rng.normal(scale=0.5, size=n))
+
+
+def exact_dist(segment, dimension=2, time_delay=1):
+    X = delay_embedding(segment, dimension, time_delay)
+    return np.sqrt(np.sum((X[:, None, :] - X[None, :, :])**2, axis=-1))
+
+
+def benchmark_rp_approx(lengths=[600, 1200, 2400, 4800], percentage=3, knn=5,
+                        dimension=2, time_delay=1, verbose=True):
+    # warm up, so numba compilation in pyts is not included in first exact timing
+    compute_rp(synthetic_hr(100), dimension=dimension, time_delay=time_delay, percentage=percentage)
+
+    results = []
+    for n in lengths:
+        segment = synthetic_hr(n)
+        for mode in ['point', 'percentage_points', 'knn']:
+            t0 = time.time()
+            if mode == 'point':
+                X_exact = compute_rp(segment, dimension=dimension, time_delay=time_delay,
+                                     percentage=percentage)
+            else:
+                X_dist = exact_dist(segment, dimension, time_delay)
+                if mode == 'knn':
+                    X_exact = mask_knn(X_dist, k=knn, policy='cols')
+                else:
+                    X_exact = rp_norm(X_dist[None], threshold='percentage_points',
+                                      percentage=percentage)[0]
+            t_exact = time.time() - t0
+
+            t0 = time.time()
+            X_approx = compute_rp_approx(segment, dimension=dimension, time_delay=time_delay,
+                                         percentage=percentage,
+                                         knn=knn if mode == 'knn' else None,
+                                         threshold='point' if mode == 'knn' else mode)
+            t_approx = time.time() - t0
+
+            entry = {'n': n, 'mode': mode, 't_exact': t_exact, 't_approx': t_approx,
+                     'nnz': X_approx.nnz, 'jaccard': rp_jaccard(X_exact, X_approx)}
+            results.append(entry)
+            if verbose:
+                print('n: {n:6d}  mode: {mode:18s}  exact: {t_exact:7.3f}s  approx: {t_approx:7.3f}s  '
+                      'nnz: {nnz:9d}  jaccard: {jaccard:0.3f}'.format(**entry))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_rp_approx()
@@ -8,16 +8,31 @@ from pprint import pprint
 import random
 import copy
 
+import numpy as np
 
-def split_recordings_by_outcome(data, thresh, key='pH'):
-    all_true = []
-    all_false = []
-    
-    for k, v in data.items():
-        if v['outcome'][key] >= thresh:
-            all_true.append(k)
-        else:
-            all_false.append(k)
+
+def split_recordings_by_outcome(data, thresh, key='pH', outcome_table=None):
+    if outcome_table is None:
+        all_true = []
+        all_false = []
+
+        for k, v in data.items():
+            if v['outcome'][key] >= thresh:
+                all_true.append(k)
+            else:
+                all_false.append(k)
+    else:
+        # vectorized comparison using table from ctg_utils.load_outcome_table (sorted by recno)
+        all_recno = np.array(list(data.keys()))
+        idx = np.searchsorted(outcome_table['recno'], all_recno)
+        found = idx < len(outcome_table)
+        found[found] = outcome_table['recno'][idx[found]] == all_recno[found]
+        if not np.all(found):
+            raise ValueError('recordings not found in outcome table: {}'.format(
+                list(all_recno[~found])))
+        selected = outcome_table[key][idx] >= thresh
+        all_true = [str(k) for k in all_recno[selected]]
+        all_false = [str(k) for k in all_recno[~selected]]
             
     random.shuffle(all_false)
     random.shuffle(all_true)
@@ -59,12 +74,22 @@ def assemble_splits(all_splits):
     return groups
 
 
-def annotate_train_valid_group(group, data, exclude=[], include=[]):
+def annotate_train_valid_group(group, data, exclude=[], include=[], policy=None,
+                               max_seg_min=None):
     results = {'train':{False: [], True: []}, 'valid':{False: [], True: []}}
     for k, v in group.items():
         for kk, vv in v.items():
             for recno in vv:
-                for fname in data[recno]['names']:
+                if (policy is not None or max_seg_min is not None) and 'sources' not in data[recno]:
+                    raise ValueError('selecting by policy or max_seg_min requires index file from '
+                                     'generate_rp_images_multi, record {} has no sources'.format(recno))
+                for i, fname in enumerate(data[recno]['names']):
+                    # index from generate_rp_images_multi records policy for each image
+                    if policy is not None and data[recno]['sources'][i]['policy'] != policy:
+                        continue
+                    if max_seg_min is not None and \
+                            data[recno]['sources'][i]['max_seg_min'] != max_seg_min:
+                        continue
                     ignore = False
                     for txt in exclude:
                         if txt in fname:
@@ -85,12 +110,14 @@ def annotate_train_valid_group(group, data, exclude=[], include=[]):
 
 
 def get_splits(image_dir='images', image_file='rp_images_index.json', 
-               thresh = 7.15, exclude=[], include=[], verbose=False):
+               thresh = 7.15, exclude=[], include=[], policy=None, max_seg_min=None,
+               outcome_table=None, verbose=False):
     random.seed(1234)
     with open(os.path.join(image_dir, image_file), 'r') as infile:
             data = json.load(infile)  
 
-    all_false, all_true = split_recordings_by_outcome(data, thresh, key='pH')
+    all_false, all_true = split_recordings_by_outcome(data, thresh, key='pH',
+                                                      outcome_table=outcome_table)
     all_selected = all_false + all_true
     all_splits = compute_splits(all_false, all_true, n_splits=5)
     
@@ -104,7 +131,8 @@ def get_splits(image_dir='images', image_file='rp_images_index.json',
     train_valid_groups_full = []
     for v in train_valid_groups:
         train_valid_groups_full.append(
-            annotate_train_valid_group(v, data, exclude=exclude, include=include))
+            annotate_train_valid_group(v, data, exclude=exclude, include=include, policy=policy,
+                                       max_seg_min=max_seg_min))
         
     return train_valid_groups_full
 
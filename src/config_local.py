@@ -10,6 +10,10 @@ GITHUB_DEFAULT_SRC_FILES = [
     'ctg_utils.py',
     'libRP.py',
     'generate_recurrence_images.py',
+    'generate_rp_cli.py',
+    'resample.py',
+    'benchmark_rp.py',
+    'rp_dataset.py',
     'test.py',  # used for test purposes only, TODO:  Delete after development complete
     ]
 
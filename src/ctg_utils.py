@@ -1,11 +1,7 @@
-import wfdb
 import os
 from pprint import pprint
 
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy
-import scipy.signal
 
 def get_all_recno(dbdir):
     for f in os.listdir(dbdir) :
@@ -42,6 +38,105 @@ def parse_meta_comments(comments, verbose=False):
     return result
 
 
+#
+# Typed Outcome Table
+#
+# Header parameters for all recordings as single NumPy structured array (one row per
+# recording, sorted by recno), allowing vectorized selection, e.g. table['pH'] >= 7.15
+#
+
+# (name, dtype) -- names are header keys exactly as returned by parse_meta_comments,
+# integer fields use -1 for missing values, float fields use NaN
+OUTCOME_SCHEMA = [
+    # Outcome measures
+    ('pH', 'f8'), ('BDecf', 'f8'), ('pCO2', 'f8'), ('BE', 'f8'), ('Apgar1', 'i4'), ('Apgar5', 'i4'),
+    # Fetus/Neonate descriptors
+    ('Gest. weeks', 'i4'), ('Weight(g)', 'i4'), ('Sex', 'i4'),
+    # Maternal (risk-)factors
+    ('Age', 'i4'), ('Gravidity', 'i4'), ('Parity', 'i4'), ('Diabetes', 'i4'), ('Hypertension', 'i4'),
+    ('Preeclampsia', 'i4'), ('Liq. praecox', 'i4'), ('Pyrexia', 'i4'), ('Meconium', 'i4'),
+    # Delivery descriptors
+    ('Presentation', 'i4'), ('Induced', 'i4'), ('I.stage', 'f8'), ('NoProgress', 'i4'),
+    ('CK/KP', 'i4'), ('II.stage', 'f8'), ('Deliv. type', 'i4'), ('dbID', 'i8'),
+    ('Rec. type', 'i4'), ('Pos. II.st.', 'i4'), ('Sig2Birth', 'i4'),
+]
+OUTCOME_TABLE_FILE = 'outcome_table.npy'
+
+
+def get_outcome_dtype(schema=OUTCOME_SCHEMA):
+    return np.dtype([('recno', 'U8')] + schema)
+
+
+def read_header_comments(dbdir, recno):
+    """Comment lines from .hea file, matching wfdb record comments, without reading signal"""
+    with open(os.path.join(dbdir, recno + '.hea'), 'r') as infile:
+        return [line.strip(' \t#\r\n') for line in infile if line.startswith('#')]
+
+
+def build_outcome_table(dbdir, schema=OUTCOME_SCHEMA):
+    """Parse headers of all recordings into structured array in a single pass
+
+    Raises ValueError if a schema field is not found in any header, since the column would
+    otherwise silently contain only missing values.
+    """
+    dtype = get_outcome_dtype(schema)
+    field_idx = {name: i + 1 for i, (name, _) in enumerate(schema)}
+    defaults = tuple([''] + [np.nan if t.startswith('f') else -1 for _, t in schema])
+
+    rows = []
+    found = set()
+    for recno in sorted(get_all_recno(dbdir)):
+        row = list(defaults)
+        row[0] = recno
+        for c in read_header_comments(dbdir, recno):
+            if c.startswith('--'):
+                continue
+            k, _, v = c.rpartition(' ')
+            i = field_idx.get(k.strip())
+            if i is None:
+                continue
+            found.add(i)
+            try:
+                v = float(v)
+            except ValueError:
+                continue
+            if dtype[i].kind == 'f' or np.isfinite(v):
+                row[i] = v
+        rows.append(tuple(row))
+
+    missing = [name for i, (name, _) in enumerate(schema, 1) if i not in found]
+    if rows and missing:
+        raise ValueError('schema fields not found in any header: {}'.format(missing))
+    return np.array(rows, dtype=dtype)
+
+
+def load_outcome_table(dbdir, cache_file=None, rebuild=False, schema=OUTCOME_SCHEMA):
+    """Outcome table for all recordings, cached on disk if cache_file is specified
+
+    Cache is used only if it has the schema, covers the same recordings and is newer than
+    every header file, otherwise the table is rebuilt.  The recordings directory is often
+    read-only, so cache_file would typically be e.g. OUTCOME_TABLE_FILE in a working directory.
+    """
+    if cache_file is None:
+        return build_outcome_table(dbdir, schema=schema)
+    dtype = get_outcome_dtype(schema)
+    all_recno = sorted(get_all_recno(dbdir))
+
+    if not rebuild and os.path.exists(cache_file):
+        table = np.load(cache_file)
+        last_modified = max([os.path.getmtime(os.path.join(dbdir, recno + '.hea'))
+                             for recno in all_recno], default=0)
+        if table.dtype == dtype and list(table['recno']) == all_recno and \
+                os.path.getmtime(cache_file) >= last_modified:
+            return table
+
+    table = build_outcome_table(dbdir, schema=schema)
+    tmp_file = cache_file + '.tmp.npy'
+    np.save(tmp_file, table)
+    os.replace(tmp_file, cache_file)
+    return table
+
+
 def physionet_ctg_generate_mask(sig):
     mask = (sig != 0)
     all_idx = np.arange(len(sig))
@@ -4,21 +4,74 @@ import json
 from pprint import pprint
 
 import numpy as np
-import scipy
-import scipy.signal
-import matplotlib.pyplot as plt
 
-import wfdb
+# wfdb and matplotlib are imported on first use to keep module import cheap
 from ctg_utils import get_all_recno, parse_meta_comments
 from basic_denoise import get_valid_segments
-from libRP import create_rp
+from libRP import create_rp, compute_rp, save_rp, rp_fname
+from resample import decimate, decimate_batch
 
 
 
 # POLICY='early_valid' # 'best_quality', 'early_valid', 'late_valid'
+SEGMENT_POLICIES = ['best_quality', 'early_valid', 'late_valid']
 
 
-def generate_rp_images(recordings_dir, n_dec=4, clip_stage_II=True, 
+def get_record_signal(recordings_dir, recno, clip_stage_II=True):
+    """Read recording, returning heart rate signal, timestamps (sec), parsed metadata and full length"""
+    import wfdb
+
+    recno_full = os.path.join(recordings_dir, recno)
+    all_sig, meta = wfdb.io.rdsamp(recno_full)
+    meta = parse_meta_comments(meta['comments'])
+
+    sig_hr = all_sig[:, 0]
+    if clip_stage_II and meta['Delivery']['II.stage'] != -1:
+        idx = int(meta['Delivery']['II.stage']*60*4)
+        sig_hr = sig_hr[:-idx]
+    ts = np.arange(len(sig_hr))/4.0
+    return sig_hr, ts, meta, all_sig.shape[0]
+
+
+def select_segment(selected_segments, policy='early_valid'):
+    """Pick segment from output of get_valid_segments according to policy"""
+    assert policy in SEGMENT_POLICIES
+    if policy == 'best_quality':
+        selected_segments = sorted(selected_segments, key=lambda x: -x['pct_valid'])
+    elif policy == 'early_valid':
+        selected_segments = sorted(selected_segments, key=lambda x: x['seg_start'])
+    elif policy == 'late_valid':
+        selected_segments = sorted(selected_segments, key=lambda x: -x['seg_end'])
+    return selected_segments[0]
+
+
+def extract_selected_hr(seg_hr, max_seg_min=10, policy='early_valid', n_dec=4, dec_ftype='iir'):
+    """Trim segment to max_seg_min minutes (end of segment for late_valid) and decimate"""
+    max_seg = int(max_seg_min*60*4)  # convert to samples
+    if policy == 'late_valid':
+        selected_hr = seg_hr[-max_seg:]
+    else:
+        selected_hr = seg_hr[:max_seg]
+
+    if n_dec > 1:
+        selected_hr = decimate(selected_hr, n_dec, ftype=dec_ftype)
+    return selected_hr
+
+
+def get_record_selected_hr(recordings_dir, recno, n_dec=4, clip_stage_II=True,
+                           max_seg_min=10, policy='early_valid', dec_ftype='iir'):
+    """Denoised and decimated segment for recording, or None if no valid segment found"""
+    sig_hr, ts, meta, _ = get_record_signal(recordings_dir, recno, clip_stage_II=clip_stage_II)
+    selected_segments = get_valid_segments(sig_hr, ts, recno, verbose=False)
+    if len(selected_segments) == 0:
+        return None, meta
+
+    seg = select_segment(selected_segments, policy=policy)
+    return extract_selected_hr(seg['seg_hr'], max_seg_min=max_seg_min, policy=policy,
+                               n_dec=n_dec, dec_ftype=dec_ftype), meta
+
+
+def generate_rp_images(recordings_dir, n_dec=4, dec_ftype='iir', clip_stage_II=True, 
                        max_seg_min=10, policy='early_valid',
                        rp_params=[{}],
                        images_dir='',
@@ -26,12 +79,12 @@ def generate_rp_images(recordings_dir, n_dec=4, clip_stage_II=True,
                        show_signal=False, show_image=False, verbose=False, cmap=None,
                        limit=-1):
     
-    assert policy in ['best_quality', 'early_valid', 'late_valid']
+    assert policy in SEGMENT_POLICIES
+    if show_signal:
+        import matplotlib.pyplot as plt
     
     if images_dir and not os.path.exists(images_dir):
         os.mkdir(images_dir)
-        
-    max_seg = int(max_seg_min*60*4)  # convert to samples
 
     results = {}
     for recno in sorted(get_all_recno(recordings_dir)):
@@ -39,18 +92,11 @@ def generate_rp_images(recordings_dir, n_dec=4, clip_stage_II=True,
         if limit == 0:
             break
             
-        recno_full = os.path.join(recordings_dir, recno)
-        all_sig, meta = wfdb.io.rdsamp(recno_full)
-        meta = parse_meta_comments(meta['comments'])
+        sig_hr, ts, meta, n_samples = get_record_signal(recordings_dir, recno,
+                                                        clip_stage_II=clip_stage_II)
         if verbose:
             print('\nRecord: {}  Samples: {}   Duration: {:0.1f} min   Stage.II: {} min'.format(
-                recno, all_sig.shape[0], all_sig.shape[0]/4/60, meta['Delivery']['II.stage']))
-
-        sig_hr = all_sig[:, 0]
-        if clip_stage_II and meta['Delivery']['II.stage'] != -1:
-            idx = int(meta['Delivery']['II.stage']*60*4)
-            sig_hr = sig_hr[:-idx]
-        ts = np.arange(len(sig_hr))/4.0
+                recno, n_samples, n_samples/4/60, meta['Delivery']['II.stage']))
             
         if show_signal:
             plt.figure(figsize=(12, 2))
@@ -66,14 +112,7 @@ def generate_rp_images(recordings_dir, n_dec=4, clip_stage_II=True,
         if len(selected_segments) == 0:
             continue
         
-        if policy == 'best_quality':
-            selected_segments = sorted(selected_segments, key=lambda x: -x['pct_valid'])
-        elif policy == 'early_valid':
-            selected_segments = sorted(selected_segments, key=lambda x: x['seg_start'])
-        elif policy == 'late_valid':
-            selected_segments = sorted(selected_segments, key=lambda x: -x['seg_end'])
-            
-        seg =  selected_segments[0]
+        seg = select_segment(selected_segments, policy=policy)
         seg_start = seg['seg_start']
         seg_end = seg['seg_end']
         seg_hr = seg['seg_hr']
@@ -100,13 +139,8 @@ def generate_rp_images(recordings_dir, n_dec=4, clip_stage_II=True,
 
             print('Valid: {:0.1f}%'.format(100 * pct_valid))
             
-        if policy == 'late_valid':
-            selected_hr = seg_hr[-max_seg:]
-        else:
-            selected_hr = seg_hr[:max_seg]
-            
-        if n_dec > 1:
-            selected_hr = scipy.signal.decimate(selected_hr,n_dec)
+        selected_hr = extract_selected_hr(seg_hr, max_seg_min=max_seg_min, policy=policy,
+                                          n_dec=n_dec, dec_ftype=dec_ftype)
 
         image_names = []
         for p in rp_params:
@@ -119,9 +153,97 @@ def generate_rp_images(recordings_dir, n_dec=4, clip_stage_II=True,
 #     if verbose:
 #         pprint(results)
     
-    with open(os.path.join(images_dir, images_index_file), 'w') as outfile:
-        json.dump(results, outfile)
+    write_index_file(results, os.path.join(images_dir, images_index_file))
+
+
+def get_selected_window(seg, max_seg_min=10, policy='early_valid'):
+    """(start, end) sample range used by extract_selected_hr for selected segment"""
+    max_seg = int(max_seg_min*60*4)  # convert to samples
+    n_seg = seg['seg_end'] - seg['seg_start']
+    if policy == 'late_valid':
+        return seg['seg_end'] - min(max_seg, n_seg), seg['seg_end']
+    return seg['seg_start'], seg['seg_start'] + min(max_seg, n_seg)
+
+
+def generate_rp_images_multi(recordings_dir, policies=SEGMENT_POLICIES, max_seg_mins=[10],
+                             n_dec=4, dec_ftype='iir', clip_stage_II=True,
+                             rp_params=[{}],
+                             images_dir='',
+                             images_index_file='rp_images_index.json',
+                             verbose=False, limit=-1):
+    """Generate RP images for several segment policies and max_seg_min values in one pass
 
+    Each record is denoised once.  Image names include policy and max_seg_min, e.g.
+    1001_late_valid_m10_d2_t1_p3.jpg, and each index entry has a 'sources' list (parallel to
+    'names') recording the policy, max_seg_min and selected window as sample positions
+    (4 Hz, before decimation) from the start of the recording.  When policies select the
+    same window the recurrence plot is only computed once.
+    """
+    for policy in policies:
+        assert policy in SEGMENT_POLICIES
+
+    if images_dir and not os.path.exists(images_dir):
+        os.mkdir(images_dir)
+
+    results = {}
+    for recno in sorted(get_all_recno(recordings_dir)):
+        limit -= 1
+        if limit == 0:
+            break
+
+        sig_hr, ts, meta, n_samples = get_record_signal(recordings_dir, recno,
+                                                        clip_stage_II=clip_stage_II)
+        selected_segments = get_valid_segments(sig_hr, ts, recno, verbose=False)
+        if len(selected_segments) == 0:
+            continue
+        i_start = selected_segments[0]['i_start']
+
+        # selected window for each (policy, max_seg_min), sharing identical windows
+        selections = []
+        windows = {}
+        for policy in policies:
+            seg = select_segment(selected_segments, policy=policy)
+            for max_seg_min in max_seg_mins:
+                window = get_selected_window(seg, max_seg_min=max_seg_min, policy=policy)
+                if window not in windows:
+                    windows[window] = extract_selected_hr(seg['seg_hr'], max_seg_min=max_seg_min,
+                                                          policy=policy, n_dec=1)
+                selections.append((policy, max_seg_min, window))
+        all_window = list(windows.keys())
+        all_selected_hr = decimate_batch([windows[w] for w in all_window], n_dec, ftype=dec_ftype)
+        windows = dict(zip(all_window, all_selected_hr))
+        if verbose:
+            print('Record: {}  Selections: {}   Unique windows: {}'.format(
+                recno, len(selections), len(windows)))
+
+        computed = {}
+        image_names = []
+        sources = []
+        for policy, max_seg_min, window in selections:
+            base_name = '{}_{}_m{}'.format(recno, policy, max_seg_min)
+            for i, p in enumerate(rp_params):
+                p = dict(p)
+                suffix = p.pop('suffix', 'jpg')
+                if (window, i) not in computed:
+                    computed[(window, i)] = compute_rp(windows[window], **p)
+                fname = rp_fname(base_name=base_name, suffix=suffix, **p)
+                save_rp(computed[(window, i)], fname, images_dir=images_dir, suffix=suffix)
+                image_names.append(fname)
+                sources.append({'policy': policy, 'max_seg_min': max_seg_min,
+                                'seg_start': int(window[0] + i_start),
+                                'seg_end': int(window[1] + i_start)})
+
+        results[recno] = {'names': image_names, 'sources': sources, 'outcome': meta['Outcome']}
+
+    write_index_file(results, os.path.join(images_dir, images_index_file))
+
+
+def write_index_file(results, fname):
+    """Write images index via temporary file, so that index is never left partially written"""
+    tmp_fname = fname + '.tmp'
+    with open(tmp_fname, 'w') as outfile:
+        json.dump(results, outfile)
+    os.replace(tmp_fname, fname)
 
 
 # Configure Recurrent Plot Parameters
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+#
+# Command line batch driver for recurrence plot generation
+#
+# Example:
+#   python generate_rp_cli.py /data/ctu-uhb-ctgdb --images-dir /data/images \
+#       --percentages 1 3 10 --workers 4
+#
+# Progress is checkpointed per record in <images-dir>/.checkpoint, together with all generation
+# settings, so a killed run can be restarted with the same arguments and only the remaining
+# records are processed.  Records checkpointed with different settings are regenerated.  The
+# images index (same format as generate_rp_images) is written atomically once all records
+# are complete.
+#
+
+import os
+import json
+import argparse
+from multiprocessing import Pool
+
+from ctg_utils import get_all_recno
+from generate_recurrence_images import (get_record_selected_hr, gen_recurrence_params,
+                                        write_index_file, SEGMENT_POLICIES)
+from libRP import create_rp
+from resample import DECIMATE_FTYPES
+
+
+OUTPUT_BACKENDS = ['jpg', 'png', 'npy', 'npz']
+CHECKPOINT_DIR = '.checkpoint'
+
+
+def str2bool(v):
+    return v.lower() in ['true', 't', 'yes', 'y', '1']
+
+
+def get_checkpoint_fname(images_dir, recno):
+    return os.path.join(images_dir, CHECKPOINT_DIR, '{}.json'.format(recno))
+
+
+def get_checkpoint_settings(rp_params, kwargs):
+    """Generation settings stored with each checkpoint, in JSON round-tripped form"""
+    return json.loads(json.dumps({'rp_params': rp_params, 'kwargs': kwargs}, sort_keys=True))
+
+
+def load_checkpoint(images_dir, recno, settings):
+    """Returns saved result for record, or None if record has not been processed with settings"""
+    fname = get_checkpoint_fname(images_dir, recno)
+    if not os.path.exists(fname):
+        return None
+    try:
+        with open(fname, 'r') as infile:
+            entry = json.load(infile)
+    except ValueError:
+        return None    # incomplete checkpoint, recompute
+    if entry.pop('settings', None) != settings:
+        return None    # generated using different parameters, policy or decimation
+    return entry
+
+
+def save_checkpoint(images_dir, recno, entry, settings):
+    write_index_file(dict(entry, settings=settings), get_checkpoint_fname(images_dir, recno))
+
+
+def process_record(args):
+    """Generate images for single record and checkpoint result"""
+    recordings_dir, recno, images_dir, rp_params, kwargs = args
+
+    selected_hr, meta = get_record_selected_hr(recordings_dir, recno, **kwargs)
+    if selected_hr is None:
+        entry = {'names': None, 'outcome': meta['Outcome']}   # no valid segment
+    else:
+        image_names = []
+        for p in rp_params:
+            fname = create_rp(selected_hr, base_name=recno, images_dir=images_dir, **p)
+            image_names.append(fname)
+        entry = {'names': image_names, 'outcome': meta['Outcome']}
+
+    save_checkpoint(images_dir, recno, entry, get_checkpoint_settings(rp_params, kwargs))
+    return recno, entry
+
+
+def run(recordings_dir, images_dir, rp_params, images_index_file='rp_images_index.json',
+        n_workers=1, limit=-1, verbose=False, **kwargs):
+    """Generate images for all records, skipping records with existing checkpoint"""
+    os.makedirs(os.path.join(images_dir, CHECKPOINT_DIR), exist_ok=True)
+
+    all_recno = sorted(get_all_recno(recordings_dir))
+    if limit > 0:
+        all_recno = all_recno[:limit]
+
+    results = {}
+    pending = []
+    for recno in all_recno:
+        entry = load_checkpoint(images_dir, recno, get_checkpoint_settings(rp_params, kwargs))
+        if entry is None:
+            pending.append((recordings_dir, recno, images_dir, rp_params, kwargs))
+        else:
+            results[recno] = entry
+    if verbose:
+        print('Records: {}   Completed: {}   Pending: {}'.format(
+            len(all_recno), len(results), len(pending)))
+
+    if n_workers > 1:
+        with Pool(n_workers) as pool:
+            for recno, entry in pool.imap_unordered(process_record, pending):
+                results[recno] = entry
+                if verbose:
+                    print('Record: {}  done'.format(recno))
+    else:
+        for args in pending:
+            recno, entry = process_record(args)
+            results[recno] = entry
+            if verbose:
+                print('Record: {}  done'.format(recno))
+
+    results = {recno: results[recno] for recno in all_recno if results[recno]['names'] is not None}
+    write_index_file(results, os.path.join(images_dir, images_index_file))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate Recurrence Plot images for CTG recordings')
+    parser.add_argument('recordings_dir', help='directory containing CTU-UHB .hea/.dat files')
+    parser.add_argument('--images-dir', default='images')
+    parser.add_argument('--images-index-file', default='rp_images_index.json')
+
+    # recurrence plot parameter grid, see gen_recurrence_params
+    parser.add_argument('--dimensions', type=int, nargs='+', default=[2])
+    parser.add_argument('--time-delays', type=int, nargs='+', default=[1])
+    parser.add_argument('--percentages', type=float, nargs='+', default=[1, 3, 10])
+    parser.add_argument('--use-clip-vals', type=str2bool, nargs='+', default=[False])
+    parser.add_argument('--imsize', type=int, default=None)
+
+    # segment selection and decimation
+    parser.add_argument('--policy', choices=SEGMENT_POLICIES, default='early_valid')
+    parser.add_argument('--max-seg-min', type=float, default=10)
+    parser.add_argument('--n-dec', type=int, default=4)
+    parser.add_argument('--dec-ftype', choices=DECIMATE_FTYPES, default='iir')
+    parser.add_argument('--no-clip-stage-II', dest='clip_stage_II', action='store_false')
+
+    parser.add_argument('--backend', choices=OUTPUT_BACKENDS, default='jpg',
+                        help='output image format, npy saves raw recurrence matrix, npz sparse matrix')
+    parser.add_argument('--sparse', action='store_true',
+                        help='keep thresholded recurrence plots in sparse form')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--limit', type=int, default=-1)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    # clipped recurrence plots keep continuous distances, so are neither thresholded nor sparse
+    if any(args.use_clip_vals):
+        if args.sparse:
+            parser.error('--sparse is not supported with --use-clip-vals true')
+        if args.backend == 'npz':
+            parser.error('--backend npz is not supported with --use-clip-vals true')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # keep integer percentages as int, so file names match generate_rp_images
+    percentages = [int(p) if p == int(p) else p for p in args.percentages]
+    rp_params = gen_recurrence_params(dimensions=args.dimensions, time_delays=args.time_delays,
+                                      percentages=percentages, use_clip_vals=args.use_clip_vals)
+    for p in rp_params:
+        p['suffix'] = args.backend
+        if args.imsize is not None:
+            p['imsize'] = args.imsize
+        if args.sparse:
+            p['sparse'] = True
+
+    results = run(args.recordings_dir, args.images_dir, rp_params,
+                  images_index_file=args.images_index_file,
+                  n_workers=args.workers, limit=args.limit, verbose=args.verbose,
+                  n_dec=args.n_dec, dec_ftype=args.dec_ftype, clip_stage_II=args.clip_stage_II,
+                  max_seg_min=args.max_seg_min, policy=args.policy)
+    if args.verbose:
+        print('Total Images', sum(len(v['names']) for v in results.values()))
+
+
+if __name__ == '__main__':
+    main()
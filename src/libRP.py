@@ -1,24 +1,28 @@
 
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from pyts.image import RecurrencePlot
-import imageio
 
+# pyts (numba), imageio and matplotlib are imported on first use to keep module import cheap
 
 
-def create_rp(segment,
-              dimension=2, time_delay=1, percentage=1, use_clip=False, knn=None, imsize=None,
-              images_dir='', base_name='Sample',
-              suffix='jpg', # suffix='png'
-              show_image=False, cmap=None, ##cmap='gray', cmap='binary'
-             ):
-    """Generate recurrence plot for specified signal segment and save to disk"""
 
-    if base_name is None:
-        base_name  = 'sample'
-    fname = '{}_d{}_t{}_p{}{}.{}'.format(base_name, dimension, time_delay, percentage,
-                                       '_clipped' if use_clip else '', suffix)
+def compute_rp(segment, dimension=2, time_delay=1, percentage=1, use_clip=False, knn=None, imsize=None,
+               sparse=False):
+    """Generate recurrence plot matrix for specified signal segment
+
+    If sparse, thresholded plot is built directly as scipy.sparse CSR matrix from a KD-tree
+    on the delay embedding, without forming the dense n**2 distance matrix (or, when imsize
+    is specified, downsampled directly from sparse form).  Not supported for use_clip.
+    """
+    if sparse:
+        assert not use_clip, 'clipped recurrence plots are not thresholded'
+        X_rp = compute_rp_sparse(segment, dimension=dimension, time_delay=time_delay,
+                                 percentage=percentage, knn=knn)
+        if imsize is not None:
+            X_rp = resize_rp_sparse(X_rp, new_shape=imsize)
+        return X_rp
+
+    from pyts.image import RecurrencePlot
 
     segment = np.expand_dims(segment, 0)
     if knn is not None:
@@ -36,23 +40,244 @@ def create_rp(segment,
         X_rp = rp.fit_transform(segment)[0]
 
     if imsize is not None:
-        X_rp = resize_rp(X_rp, new_shape=imsize, use_max=True)
+        X_rp = resize_rp(X_rp, new_shape=imsize)
+    return X_rp
+
+
+def compute_rp_sparse(segment, dimension=2, time_delay=1, percentage=1, knn=None):
+    """Sparse equivalent of compute_rp for thresholded ('point') and knn modes
+
+    The KD-tree only selects candidate pairs.  Their distances are recomputed with
+    pair_distances and the percentile follows np.percentile, so pairs at the threshold are
+    classified as in the dense plot.
+    """
+    from scipy.spatial import cKDTree
+
+    X = delay_embedding(np.asarray(segment, dtype=np.float64), dimension, time_delay)
+    tree = cKDTree(X)
+    if knn is not None:
+        return knn_sparse_rp(tree, X, knn)
+    return radius_sparse_rp(tree, exact_distance_percentile(tree, X, percentage), X=X)
+
+
+# relative slack on KD-tree radius, so candidate pairs include all pairs at the threshold
+# regardless of rounding differences between KD-tree and pair_distances
+RADIUS_SLACK = 1e-9
+
+
+def pair_distances(X, rows, cols):
+    """Distances between embedded points, using the same floating point operations as
+    pyts RecurrencePlot (abs difference for dimension 1, else sequential sum of squares)"""
+    if X.shape[1] == 1:
+        return np.abs(X[rows, 0] - X[cols, 0])
+    total = np.zeros(len(rows))
+    for d in range(X.shape[1]):
+        diff = X[rows, d] - X[cols, d]
+        total += diff * diff
+    return np.sqrt(total)
+
+
+def delay_embedding(segment, dimension=2, time_delay=1):
+    """Delay embedding of signal as (n_points, dimension) array, as used by RecurrencePlot"""
+    n_points = len(segment) - (dimension - 1) * time_delay
+    return np.stack([segment[i * time_delay:i * time_delay + n_points] for i in range(dimension)],
+                    axis=1)
+
+
+def estimate_distance_percentile(X, percentage, n_sample_pairs=100000, seed=0):
+    """Estimate percentile of all pairwise distances of embedded points from random pairs"""
+    rng = np.random.RandomState(seed)
+    i = rng.randint(0, X.shape[0], size=n_sample_pairs)
+    j = rng.randint(0, X.shape[0], size=n_sample_pairs)
+    return np.percentile(np.sqrt(np.sum((X[i] - X[j])**2, axis=1)), percentage)
+
+
+def exact_distance_percentile(tree, X, percentage, n_sample_pairs=100000, seed=0):
+    """Percentile of all n**2 pairwise distances, as np.percentile on dense distance matrix
+
+    Only pairs within a radius somewhat above the estimated percentile are enumerated, with
+    the radius doubled until the required order statistics are covered.  Distances are
+    recomputed with pair_distances, matching the dense distance matrix of compute_rp.
+    """
+    n_total = tree.n ** 2
+    q = percentage / 100
+    virtual = (n_total - 1) * q              # np.percentile 'linear' method
+    lo = min(max(int(np.floor(virtual)), 0), n_total - 1)
+    hi = min(lo + 1, n_total - 1)
+    gamma = virtual - np.floor(virtual)
+
+    r = estimate_distance_percentile(X, min(100, 1.5 * percentage + 0.5),
+                                     n_sample_pairs=n_sample_pairs, seed=seed)
+    r = max(r, 1e-9)
+    while True:
+        pairs = tree.sparse_distance_matrix(tree, r, output_type='ndarray')
+        dist = pair_distances(X, pairs['i'], pairs['j'])
+        dist = dist[dist <= r * (1 - RADIUS_SLACK)]   # complete set of pairs up to this distance
+        if len(dist) > hi:
+            break
+        r *= 2
+
+    a, b = np.partition(dist, [lo, hi])[[lo, hi]]
+    if virtual < 0 or virtual >= n_total - 1:
+        return a if virtual < 0 else b
+    diff = b - a
+    if gamma >= 0.5:
+        return b - diff * (1 - gamma)
+    return a + diff * gamma
+
+
+def compute_rp_approx(segment, dimension=2, time_delay=1, percentage=1, knn=None,
+                      threshold='point', n_sample_pairs=100000, seed=0):
+    """Approximate thresholded recurrence plot using KD-tree on delay embedding
+
+    Only near neighbors of each point are searched, so cost scales with the number of
+    recurrences rather than n**2.  Returns symmetric scipy.sparse CSR boolean matrix.
+      threshold='point' or 'percentage_points':  distance < percentile of all pairwise
+          distances (as compute_rp default and rp_norm), with the percentile estimated
+          from n_sample_pairs random pairs
+      threshold=<float>:  distance < fixed threshold
+      knn:  k nearest neighbors in each column including ties (as mask_knn), overrides
+          threshold
+    """
+    from scipy.spatial import cKDTree
+
+    if knn is None and threshold not in ['point', 'percentage_points'] and \
+            (isinstance(threshold, (str, bool)) or not isinstance(threshold, (int, float, np.number))):
+        raise ValueError("threshold must be 'point', 'percentage_points' or a distance, got {!r}".format(
+            threshold))
+
+    X = delay_embedding(np.asarray(segment, dtype=np.float64), dimension, time_delay)
+    tree = cKDTree(X)
+
+    if knn is not None:
+        return knn_sparse_rp(tree, X, knn)
+
+    if threshold in ['point', 'percentage_points']:
+        r = estimate_distance_percentile(X, percentage, n_sample_pairs=n_sample_pairs, seed=seed)
+    else:
+        r = threshold
+    return radius_sparse_rp(tree, r)
+
+
+def radius_sparse_rp(tree, r, X=None):
+    """Sparse recurrence plot for all pairs of points with distance < r
+
+    If embedded points X are given, distances are recomputed with pair_distances so the
+    result matches compute_rp exactly, otherwise KD-tree distances are used.
+    """
+    from scipy.sparse import csr_matrix
+
+    n = tree.n
+    if r <= 0:
+        return csr_matrix((n, n), dtype=bool)
+    if X is None:
+        pairs = tree.query_pairs(np.nextafter(r, 0), output_type='ndarray')   # query_pairs is <= r, so strict < r
+    else:
+        pairs = tree.query_pairs(r * (1 + RADIUS_SLACK), output_type='ndarray')
+        pairs = pairs[pair_distances(X, pairs[:, 0], pairs[:, 1]) < r]
+    diag = np.arange(n)
+    rows = np.concatenate([pairs[:, 0], pairs[:, 1], diag])
+    cols = np.concatenate([pairs[:, 1], pairs[:, 0], diag])
+    return csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n, n))
+
+
+def knn_sparse_rp(tree, X, k):
+    """Sparse equivalent of mask_knn(policy='cols'), column i marks points within distance
+    of k-th nearest neighbor of point i (counting point i itself)"""
+    from scipy.sparse import csr_matrix
+
+    n = tree.n
+    k = min(k, n - 1)
+    dist, _ = tree.query(X, k=k + 1)
+    r = np.reshape(dist, (n, k + 1))[:, k] * (1 + RADIUS_SLACK)
+    neighbors = tree.query_ball_point(X, r=r)
+    cols = np.repeat(np.arange(n), [len(v) for v in neighbors])
+    rows = np.concatenate([np.asarray(v, dtype=int) for v in neighbors])
+
+    # k-th smallest recomputed distance in each column, candidates grouped by column
+    dist = pair_distances(X, rows, cols)
+    order = np.lexsort((dist, cols))
+    kth = dist[order][np.searchsorted(cols[order], np.arange(n)) + k]
+    keep = dist <= kth[cols]
+    return csr_matrix((np.ones(np.sum(keep), dtype=bool), (rows[keep], cols[keep])), shape=(n, n))
+
 
-    imageio.imwrite(os.path.join(images_dir, fname), np_to_uint8(X_rp))
+def rp_jaccard(X_exact, X_approx):
+    """Agreement between exact (dense) and approximate (sparse or dense) recurrence plots"""
+    if hasattr(X_approx, 'toarray'):
+        X_approx = X_approx.toarray()
+    X_exact, X_approx = X_exact.astype(bool), X_approx.astype(bool)
+    n_union = np.sum(np.logical_or(X_exact, X_approx))
+    if n_union == 0:
+        return 1.0
+    return np.sum(np.logical_and(X_exact, X_approx)) / n_union
+
+
+def rp_fname(base_name='Sample', dimension=2, time_delay=1, percentage=1, use_clip=False,
+             suffix='jpg', **kwargs):
+    """Image file name associated with recurrence plot parameters"""
+    if base_name is None:
+        base_name  = 'sample'
+    return '{}_d{}_t{}_p{}{}.{}'.format(base_name, dimension, time_delay, percentage,
+                                        '_clipped' if use_clip else '', suffix)
+
+
+def create_rp(segment,
+              dimension=2, time_delay=1, percentage=1, use_clip=False, knn=None, imsize=None,
+              sparse=False, images_dir='', base_name='Sample',
+              suffix='jpg', # suffix='png', suffix='npy' saves raw matrix, suffix='npz' sparse matrix
+              show_image=False, cmap=None, ##cmap='gray', cmap='binary'
+             ):
+    """Generate recurrence plot for specified signal segment and save to disk"""
+
+    fname = rp_fname(base_name=base_name, dimension=dimension, time_delay=time_delay,
+                     percentage=percentage, use_clip=use_clip, suffix=suffix)
+
+    X_rp = compute_rp(segment, dimension=dimension, time_delay=time_delay, percentage=percentage,
+                      use_clip=use_clip, knn=knn, imsize=imsize, sparse=sparse)
+    save_rp(X_rp, fname, images_dir=images_dir, suffix=suffix, show_image=show_image, cmap=cmap)
+    return fname
+
+
+def save_rp(X_rp, fname, images_dir='', suffix='jpg', show_image=False, cmap=None):
+    """Save recurrence plot matrix to disk in format given by suffix"""
+    if suffix == 'npz':
+        from scipy.sparse import csr_matrix, save_npz
+        X_rp = X_rp.tocsr() if is_sparse_rp(X_rp) else csr_matrix(X_rp)   # keeps actual values
+        save_npz(os.path.join(images_dir, fname), X_rp)
+    elif suffix == 'npy':
+        np.save(os.path.join(images_dir, fname), to_dense_rp(X_rp))
+    else:
+        import imageio
+        if is_sparse_rp(X_rp):
+            imageio.imwrite(os.path.join(images_dir, fname), sparse_to_uint8(X_rp))
+        else:
+            imageio.imwrite(os.path.join(images_dir, fname), np_to_uint8(X_rp))
     if show_image:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(3, 3))
-        plt.imshow(X_rp, cmap=cmap, origin='lower')
+        plt.imshow(to_dense_rp(X_rp), cmap=cmap, origin='lower')
         plt.title('Recurrence Plot for {}'.format(fname), fontsize=14)
         plt.show()
-    return fname
 
 
 def np_to_uint8(X):
+    X = X.astype(np.float64)    # copy, also handles boolean (knn / resized) matrices
     X -= X.min()
-    X = (255/X.max())*X
+    if X.max() > 0:
+        X = (255/X.max())*X
     return X.astype(np.uint8)
 
 
+def np_to_float32(X):
+    """Rescale matrix to [0, 1] range, as seen by model after reading back uint8 image"""
+    X = X.astype(np.float32)
+    X -= X.min()
+    if X.max() > 0:
+        X /= X.max()
+    return X
+
+
 def rp_norm(X_dist, threshold=None, percentage=10):
     """Rescale Recurrence Plot after setting nearest-neighbor threshold"""
     n_samples  = X_dist.shape[0]    # typically value is 1
@@ -66,7 +291,7 @@ def rp_norm(X_dist, threshold=None, percentage=10):
             percentage, axis=1
         )
         X_rp = X_dist < percents[:, None, None]
-    if threshold == 'percentage_clipped':
+    elif threshold == 'percentage_clipped':
         percents = np.percentile(
             np.reshape(X_dist, (n_samples, image_size * image_size)),
             percentage, axis=1
@@ -124,13 +349,10 @@ def align_rp(m, n_align=64):
         padded_m = np.zeros((new_rows,new_cols), dtype=bool)
 
         if rows == new_rows:
-            padded_m[:, pad_cols_l:-pad_cols_r] = a
+            padded_m[:, pad_cols_l:-pad_cols_r] = m
         elif cols == new_cols:
-            padded_m[pad_rows_l:-pad_rows_r, :] = a
+            padded_m[pad_rows_l:-pad_rows_r, :] = m
         else:
-            print('')
-            print(padded_m.shape)
-            print(padded_m[pad_rows_l:-pad_rows_r, pad_cols_l:-pad_cols_r].shape)
             padded_m[pad_rows_l:-pad_rows_r, pad_cols_l:-pad_cols_r] = m
     return padded_m
 
@@ -151,3 +373,99 @@ def resize_rp(mat, new_shape=64, use_mean=False):
             for j, jj in enumerate(range(0, cols, downscale_col)):
                 result[i, j] = np.max(mat[ii:ii + downscale_row, jj:jj + downscale_col])
     return result
+
+
+#
+# Sparse recurrence plots
+#
+# Thresholded plots (typically 1-10% recurrence rate) stored as scipy.sparse CSR boolean
+# matrices, with downstream operations that scale with the number of recurrences.
+#
+
+def is_sparse_rp(X_rp):
+    return hasattr(X_rp, 'tocoo')
+
+
+def to_sparse_rp(X_rp):
+    """Convert thresholded recurrence plot to CSR boolean matrix"""
+    from scipy.sparse import csr_matrix
+    if is_sparse_rp(X_rp):
+        return X_rp.tocsr()
+    return csr_matrix(np.asarray(X_rp) != 0)
+
+
+def to_dense_rp(X_rp):
+    if is_sparse_rp(X_rp):
+        return X_rp.toarray()
+    return X_rp
+
+
+def sparse_rp_coords(mat):
+    """Row and column indices of recurrence points, ignoring explicit zeros"""
+    coo = mat.tocoo()
+    coo.sum_duplicates()
+    keep = coo.data != 0
+    return coo.row[keep], coo.col[keep]
+
+
+def resize_rp_sparse(mat, new_shape=64, use_mean=False):
+    """Block downsampling of sparse recurrence plot, equivalent to resize_rp on dense matrix"""
+    rows, cols = mat.shape
+    new_rows, pad_rows_l, _ = compute_padding(rows, new_shape)
+    new_cols, pad_cols_l, _ = compute_padding(cols, new_shape)
+    downscale_row, downscale_col = new_rows // new_shape, new_cols // new_shape
+
+    row_idx, col_idx = sparse_rp_coords(mat)
+    counts = np.zeros((new_shape, new_shape))
+    np.add.at(counts, ((row_idx + pad_rows_l) // downscale_row,
+                       (col_idx + pad_cols_l) // downscale_col), 1)
+    if use_mean:
+        return counts / (downscale_row * downscale_col)
+    return counts > 0
+
+
+def sparse_to_uint8(mat):
+    """Rasterise sparse recurrence plot, equivalent to np_to_uint8 on dense boolean matrix"""
+    img = np.zeros(mat.shape, dtype=np.uint8)
+    row_idx, col_idx = sparse_rp_coords(mat)
+    img[row_idx, col_idx] = 255
+    return img
+
+
+def _line_lengths(major, minor):
+    """Lengths of runs of consecutive minor indices sharing the same major index"""
+    if len(major) == 0:
+        return np.zeros(0, dtype=int)
+    order = np.lexsort((minor, major))
+    major, minor = major[order], minor[order]
+    breaks = np.flatnonzero((np.diff(major) != 0) | (np.diff(minor) != 1)) + 1
+    bounds = np.concatenate([[0], breaks, [len(major)]])
+    return np.diff(bounds)
+
+
+def rqa_sparse(mat, l_min=2, v_min=2, exclude_loi=True):
+    """RQA measures from sparse recurrence plot using diagonal and vertical line counts
+
+    Returns dict with recurrence rate, determinism (fraction of recurrence points on diagonal
+    lines of length >= l_min), laminarity (vertical lines of length >= v_min), mean and max
+    diagonal line length.  The line of identity is excluded from diagonal lines if exclude_loi.
+    """
+    row_idx, col_idx = sparse_rp_coords(mat)
+    n_rec = len(row_idx)
+
+    diag_row, diag_col = row_idx, col_idx
+    if exclude_loi:
+        off_diag = row_idx != col_idx
+        diag_row, diag_col = row_idx[off_diag], col_idx[off_diag]
+    diag_lengths = _line_lengths(diag_col - diag_row, diag_row)
+    diag_lengths = diag_lengths[diag_lengths >= l_min]
+
+    vert_lengths = _line_lengths(col_idx, row_idx)
+    vert_lengths = vert_lengths[vert_lengths >= v_min]
+
+    return {'RR': n_rec / (mat.shape[0] * mat.shape[1]),
+            'DET': np.sum(diag_lengths) / max(len(diag_row), 1),
+            'LAM': np.sum(vert_lengths) / max(n_rec, 1),
+            'L': np.mean(diag_lengths) if len(diag_lengths) else 0.0,
+            'L_max': int(np.max(diag_lengths)) if len(diag_lengths) else 0,
+            }
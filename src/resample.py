@@ -0,0 +1,72 @@
+#
+# Decimation / Resampling
+#
+# Equivalent to scipy.signal.decimate(x, n_dec) (8th order Chebyshev type I, zero phase),
+# but filter design is cached per n_dec and equal length segments are filtered together
+# as a single 2-D array.  ftype='fir' offers cheaper polyphase FIR decimation.
+#
+
+from functools import lru_cache
+
+import numpy as np
+
+# scipy.signal is imported on first use to keep module import cheap
+
+
+DECIMATE_FTYPES = ['iir', 'fir']
+
+
+@lru_cache(maxsize=None)
+def get_decimate_sos(n_dec, order=8):
+    """IIR anti-aliasing filter used by scipy.signal.decimate, as second order sections"""
+    import scipy.signal
+    return scipy.signal.cheby1(order, 0.05, 0.8 / n_dec, output='sos')
+
+
+@lru_cache(maxsize=None)
+def get_decimate_fir(n_dec):
+    """FIR anti-aliasing filter used by scipy.signal.decimate(ftype='fir')"""
+    import scipy.signal
+    return scipy.signal.firwin(20 * n_dec + 1, 1. / n_dec, window='hamming')
+
+
+def decimate_array(X, n_dec, ftype='iir', axis=-1):
+    """Decimate array along axis, filtering all rows in a single call"""
+    import scipy.signal
+
+    assert ftype in DECIMATE_FTYPES
+    X = np.asarray(X, dtype=np.float64)
+    if n_dec <= 1:
+        return X
+
+    if ftype == 'fir':
+        return scipy.signal.resample_poly(X, 1, n_dec, axis=axis, window=get_decimate_fir(n_dec))
+
+    y = scipy.signal.sosfiltfilt(get_decimate_sos(n_dec), X, axis=axis)
+    sl = [slice(None)] * y.ndim
+    sl[axis] = slice(None, None, n_dec)
+    return y[tuple(sl)]
+
+
+def decimate(x, n_dec, ftype='iir'):
+    """Decimate single signal vector"""
+    return decimate_array(x, n_dec, ftype=ftype)
+
+
+def decimate_batch(segments, n_dec, ftype='iir'):
+    """Decimate list of signal vectors, grouping equal length segments into 2-D batches
+
+    Returns list of decimated segments in the same order as input, with None entries
+    passed through unchanged.
+    """
+    results = [None] * len(segments)
+    by_length = {}
+    for i, seg in enumerate(segments):
+        if seg is not None:
+            by_length.setdefault(len(seg), []).append(i)
+
+    for idx in by_length.values():
+        Y = decimate_array(np.stack([segments[i] for i in idx]), n_dec, ftype=ftype, axis=-1)
+        for i, y in zip(idx, Y):
+            results[i] = y
+    return results
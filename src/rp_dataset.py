@@ -0,0 +1,157 @@
+#
+# In-memory Recurrence Plot Dataset
+#
+# Holds denoised/decimated segment for each recording and computes RP matrices on demand,
+# avoiding the JPEG round trip through disk required by generate_rp_images.  Parameters
+# are the same as generate_rp_images, with rp_params typically from gen_recurrence_params.
+#
+
+from collections import OrderedDict
+from multiprocessing import Pool
+
+import numpy as np
+
+from ctg_utils import get_all_recno
+from generate_recurrence_images import get_record_selected_hr
+from libRP import compute_rp, rp_fname, np_to_float32, to_dense_rp
+from resample import decimate_batch
+
+try:
+    import torch
+    from torch.utils.data import Dataset
+except ImportError:
+    torch = None
+    Dataset = object
+
+
+# keyword arguments of compute_rp accepted in rp_params
+RP_PARAMS = ['dimension', 'time_delay', 'percentage', 'use_clip', 'knn', 'imsize', 'sparse']
+
+
+def _load_record(args):
+    """Worker process helper, returns (recno, selected_hr, outcome)"""
+    recordings_dir, recno, kwargs = args
+    selected_hr, meta = get_record_selected_hr(recordings_dir, recno, **kwargs)
+    return recno, selected_hr, meta['Outcome']
+
+
+def _compute_rp(args):
+    """Worker process helper, returns recurrence plot matrix"""
+    selected_hr, p = args
+    return compute_rp(selected_hr, **p)
+
+
+class RPDataset(Dataset):
+    """PyTorch-style dataset generating recurrence plots on the fly
+
+    Each item corresponds to a (recording, rp_params entry) pair and returns (image, label),
+    where image is a float32 array (torch tensor if available) of shape
+    (n_channels, rows, cols) scaled to [0, 1] and label is 1 if outcome[key] >= thresh.
+    """
+    def __init__(self, recordings_dir, rp_params=[{}], n_dec=4, dec_ftype='iir', clip_stage_II=True,
+                 max_seg_min=10, policy='early_valid', recnos=None,
+                 thresh=7.15, key='pH', n_channels=1,
+                 cache_size=1024, n_workers=0, limit=-1, verbose=False):
+        for p in rp_params:
+            unknown = set(p) - set(RP_PARAMS) - set(['suffix'])
+            if unknown:
+                raise ValueError('unknown rp_params keys: {}'.format(sorted(unknown)))
+        # suffix only applies to images written to disk
+        self.rp_params = [{k: v for k, v in p.items() if k in RP_PARAMS} for p in rp_params]
+        self.thresh = thresh
+        self.key = key
+        self.n_channels = n_channels
+        self.cache_size = cache_size
+        self.n_workers = n_workers
+        self._cache = OrderedDict()
+
+        if recnos is None:
+            recnos = sorted(get_all_recno(recordings_dir))
+            if limit > 0:
+                recnos = recnos[:limit]
+        # decimation deferred so that all segments are filtered as a batch
+        kwargs = {'n_dec': 1, 'clip_stage_II': clip_stage_II,
+                  'max_seg_min': max_seg_min, 'policy': policy}
+        all_args = [(recordings_dir, recno, kwargs) for recno in recnos]
+
+        if n_workers > 1:
+            with Pool(n_workers) as pool:
+                loaded = pool.map(_load_record, all_args)
+        else:
+            loaded = [_load_record(args) for args in all_args]
+        all_selected_hr = decimate_batch([selected_hr for _, selected_hr, _ in loaded], n_dec,
+                                         ftype=dec_ftype)
+
+        self.segments = OrderedDict()
+        self.outcomes = {}
+        for (recno, _, outcome), selected_hr in zip(loaded, all_selected_hr):
+            if selected_hr is None:
+                if verbose:
+                    print('Record: {}  no valid segment, skipped'.format(recno))
+                continue
+            self.segments[recno] = selected_hr
+            self.outcomes[recno] = outcome
+        self.recnos = list(self.segments.keys())
+
+    def __len__(self):
+        return len(self.recnos) * len(self.rp_params)
+
+    def get_item_key(self, idx):
+        """Returns (recno, rp_params index) associated with item"""
+        return self.recnos[idx // len(self.rp_params)], idx % len(self.rp_params)
+
+    def get_fname(self, idx):
+        """Image file name that create_rp would have used for this item"""
+        recno, i = self.get_item_key(idx)
+        return rp_fname(base_name=recno, **self.rp_params[i])
+
+    def get_label(self, idx):
+        recno, _ = self.get_item_key(idx)
+        return 1 if self.outcomes[recno][self.key] >= self.thresh else 0
+
+    def _cache_put(self, item_key, X_rp):
+        self._cache[item_key] = X_rp
+        self._cache.move_to_end(item_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get_rp(self, idx):
+        """Recurrence plot matrix for item, using LRU cache of computed matrices"""
+        item_key = self.get_item_key(idx)
+        if item_key in self._cache:
+            self._cache.move_to_end(item_key)
+            return self._cache[item_key]
+        recno, i = item_key
+        X_rp = compute_rp(self.segments[recno], **self.rp_params[i])
+        self._cache_put(item_key, X_rp)
+        return X_rp
+
+    def prefetch(self, indices=None):
+        """Compute recurrence plots for indices (default: all) using worker processes"""
+        if indices is None:
+            indices = range(len(self))
+        item_keys = [self.get_item_key(idx) for idx in indices]
+        item_keys = [k for k in item_keys if k not in self._cache][-self.cache_size:]
+        all_args = [(self.segments[recno], self.rp_params[i]) for recno, i in item_keys]
+
+        if self.n_workers > 1:
+            with Pool(self.n_workers) as pool:
+                all_rp = pool.map(_compute_rp, all_args)
+        else:
+            all_rp = [_compute_rp(args) for args in all_args]
+
+        for item_key, X_rp in zip(item_keys, all_rp):
+            self._cache_put(item_key, X_rp)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError('index {} out of range'.format(idx))
+
+        X = np_to_float32(to_dense_rp(self.get_rp(idx)))
+        X = np.repeat(X[None, :, :], self.n_channels, axis=0)
+        y = self.get_label(idx)
+        if torch is not None:
+            return torch.from_numpy(X), y
+        return X, y
@@ -0,0 +1,73 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+# comment block in the layout of CTU-UHB .hea files
+HEADER_COMMENTS = '''----- Additional parameters for record {recno}
+-- Outcome measures
+pH           {ph}
+BDecf        8.14
+pCO2         7.7
+BE           -10.5
+Apgar1       6
+Apgar5       8
+-- Fetus/Neonate descriptors
+Gest. weeks  37
+Weight(g)    2660
+Sex          2
+-- Maternal (risk-)factors
+Age          32
+Gravidity    1
+Parity       0
+Diabetes     0
+Hypertension 0
+Preeclampsia 0
+Liq. praecox 1
+Pyrexia      0
+Meconium     0
+-- Delivery descriptors
+Presentation 2
+Induced      0
+I.stage      400
+NoProgress   0
+CK/KP        0
+II.stage     15
+Deliv. type  1
+dbID         1023779
+Rec. type    1
+Pos. II.st.  -1
+Sig2Birth    -1'''
+
+# pH and number of leading zero samples (unstable start trimmed by find_valid_start)
+SYNTHETIC_RECORDS = {'1001': (7.14, 0), '1002': (7.30, 37), '1003': (7.02, 0)}
+
+
+def write_synthetic_recordings(dbdir, n_min=40):
+    """CTU-UHB style wfdb records: random walk FHR with a 25 sec dropout, giving two valid
+    segments per record once the 15 min of stage II is clipped"""
+    wfdb = pytest.importorskip('wfdb')
+    rng = np.random.RandomState(0)
+    n = n_min * 60 * 4
+    for recno, (ph, n_zeros) in SYNTHETIC_RECORDS.items():
+        hr = np.clip(140 + np.cumsum(rng.normal(scale=0.3, size=n)), 60, 190).round(2)
+        hr[:n_zeros] = 0
+        hr[4000:4100] = 0
+        uc = np.abs(rng.normal(size=n)) * 10
+        wfdb.wrsamp(recno, fs=4, units=['bpm', 'nd'], sig_name=['FHR', 'UC'],
+                    p_signal=np.stack([hr, uc], axis=1), fmt=['16', '16'],
+                    adc_gain=[100, 100], baseline=[0, 0],
+                    comments=HEADER_COMMENTS.format(recno=recno, ph=ph).split('\n'),
+                    write_dir=str(dbdir))
+    return str(dbdir)
+
+
+@pytest.fixture(scope='session')
+def recordings_dir(tmp_path_factory):
+    return write_synthetic_recordings(tmp_path_factory.mktemp('ctgdb'))
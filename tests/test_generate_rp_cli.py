@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+import generate_rp_cli
+from generate_rp_cli import run, get_checkpoint_fname, parse_args
+from generate_recurrence_images import generate_rp_images, gen_recurrence_params
+
+
+RP_PARAMS = gen_recurrence_params(percentages=[3])
+KWARGS = {'n_dec': 4, 'dec_ftype': 'iir', 'clip_stage_II': True, 'max_seg_min': 10,
+          'policy': 'early_valid'}
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Records passed to process_record during run"""
+    processed = []
+    process_record = generate_rp_cli.process_record
+
+    def wrapped(args):
+        processed.append(args[1])
+        return process_record(args)
+    monkeypatch.setattr(generate_rp_cli, 'process_record', wrapped)
+    return processed
+
+
+def load_index(images_dir):
+    with open(os.path.join(images_dir, 'rp_images_index.json'), 'r') as infile:
+        return json.load(infile)
+
+
+def test_run_matches_generate_rp_images(recordings_dir, tmp_path):
+    images_dir = str(tmp_path / 'cli')
+    run(recordings_dir, images_dir, RP_PARAMS, **KWARGS)
+
+    ref_dir = str(tmp_path / 'ref')
+    generate_rp_images(recordings_dir, images_dir=ref_dir, rp_params=RP_PARAMS, **KWARGS)
+    assert load_index(images_dir) == load_index(ref_dir)
+    for entry in load_index(ref_dir).values():
+        for fname in entry['names']:
+            with open(os.path.join(images_dir, fname), 'rb') as f1, \
+                    open(os.path.join(ref_dir, fname), 'rb') as f2:
+                assert f1.read() == f2.read()
+
+
+def test_run_resume(recordings_dir, tmp_path, processed):
+    images_dir = str(tmp_path / 'images')
+    run(recordings_dir, images_dir, RP_PARAMS, **KWARGS)
+    assert sorted(processed) == ['1001', '1002', '1003']
+    index = load_index(images_dir)
+
+    # killed run: one checkpoint missing, index not yet written
+    del processed[:]
+    os.remove(get_checkpoint_fname(images_dir, '1002'))
+    os.remove(os.path.join(images_dir, 'rp_images_index.json'))
+    run(recordings_dir, images_dir, RP_PARAMS, **KWARGS)
+    assert processed == ['1002']
+    assert load_index(images_dir) == index
+
+    del processed[:]
+    run(recordings_dir, images_dir, RP_PARAMS, **KWARGS)
+    assert processed == []
+
+
+@pytest.mark.parametrize('changed', [{'n_dec': 2}, {'policy': 'late_valid'},
+                                     {'max_seg_min': 5}])
+def test_run_settings_invalidate_checkpoints(recordings_dir, tmp_path, processed, changed):
+    images_dir = str(tmp_path / 'images')
+    run(recordings_dir, images_dir, RP_PARAMS, **KWARGS)
+
+    del processed[:]
+    run(recordings_dir, images_dir, RP_PARAMS, **dict(KWARGS, **changed))
+    assert sorted(processed) == ['1001', '1002', '1003']
+
+    del processed[:]
+    run(recordings_dir, images_dir, gen_recurrence_params(percentages=[10]), **KWARGS)
+    assert sorted(processed) == ['1001', '1002', '1003']
+
+
+@pytest.mark.parametrize('option', [['--sparse'], ['--backend', 'npz']])
+def test_parse_args_rejects_clipped_sparse(option):
+    with pytest.raises(SystemExit):
+        parse_args(['recordings'] + option + ['--use-clip-vals', 'false', 'true'])
+    assert parse_args(['recordings'] + option)
@@ -0,0 +1,118 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import generate_recurrence_images
+from generate_recurrence_images import (SEGMENT_POLICIES, generate_rp_images,
+                                        generate_rp_images_multi, get_selected_window,
+                                        select_segment)
+from compute_metadata import annotate_train_valid_group
+from conftest import SYNTHETIC_RECORDS
+
+
+RP_PARAMS = [{'dimension': 2, 'time_delay': 1, 'percentage': 3, 'use_clip': False,
+              'suffix': 'npy'}]
+
+SEGMENTS = [{'seg_start': 0, 'seg_end': 4000, 'pct_valid': 0.95},
+            {'seg_start': 5000, 'seg_end': 6000, 'pct_valid': 1.0},
+            {'seg_start': 7000, 'seg_end': 9000, 'pct_valid': 0.9}]
+
+
+def load_index(images_dir):
+    with open(os.path.join(images_dir, 'rp_images_index.json'), 'r') as infile:
+        return json.load(infile)
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Segments passed to compute_rp by generate_rp_images_multi"""
+    computed = []
+    compute_rp = generate_recurrence_images.compute_rp
+
+    def wrapped(segment, **kwargs):
+        computed.append(segment)
+        return compute_rp(segment, **kwargs)
+    monkeypatch.setattr(generate_recurrence_images, 'compute_rp', wrapped)
+    return computed
+
+
+@pytest.mark.parametrize('policy, expected', [('best_quality', 5000), ('early_valid', 0),
+                                              ('late_valid', 7000)])
+def test_select_segment(policy, expected):
+    assert select_segment(SEGMENTS, policy=policy)['seg_start'] == expected
+
+
+@pytest.mark.parametrize('policy, max_seg_min, expected', [
+    ('early_valid', 10, (0, 2400)), ('late_valid', 10, (1600, 4000)),
+    ('best_quality', 10, (0, 2400)), ('early_valid', 20, (0, 4000)),
+    ('late_valid', 20, (0, 4000))])
+def test_get_selected_window(policy, max_seg_min, expected):
+    assert get_selected_window(SEGMENTS[0], max_seg_min=max_seg_min, policy=policy) == expected
+
+
+def test_multi_shares_windows(recordings_dir, tmp_path, computed):
+    images_dir = str(tmp_path / 'images')
+    generate_rp_images_multi(recordings_dir, max_seg_mins=[10, 20], rp_params=RP_PARAMS,
+                             images_dir=images_dir)
+    index = load_index(images_dir)
+
+    for recno, v in index.items():
+        windows = {(s['seg_start'], s['seg_end']) for s in v['sources']}
+        assert len(v['names']) == len(v['sources']) == len(SEGMENT_POLICIES) * 2
+        # all policies select the same (only) segment, which max_seg_min=20 covers entirely,
+        # so 6 selections share 3 windows
+        assert len(windows) == 3
+    assert len(computed) == 3 * len(index)
+
+
+def test_multi_sources_positions(recordings_dir, tmp_path):
+    images_dir = str(tmp_path / 'images')
+    generate_rp_images_multi(recordings_dir, rp_params=RP_PARAMS, images_dir=images_dir)
+    index = load_index(images_dir)
+
+    for recno, (_, n_zeros) in SYNTHETIC_RECORDS.items():
+        sources = {s['policy']: s for s in index[recno]['sources']}
+        assert sources['early_valid']['seg_start'] == n_zeros
+        assert sources['early_valid']['seg_end'] == n_zeros + 2400
+        assert sources['late_valid']['seg_end'] == 4000     # start of dropout
+
+
+@pytest.mark.parametrize('policy', SEGMENT_POLICIES)
+def test_multi_matches_generate_rp_images(recordings_dir, tmp_path, policy):
+    multi_dir, single_dir = str(tmp_path / 'multi'), str(tmp_path / 'single')
+    generate_rp_images_multi(recordings_dir, policies=[policy], rp_params=RP_PARAMS,
+                             images_dir=multi_dir)
+    generate_rp_images(recordings_dir, policy=policy, rp_params=RP_PARAMS, images_dir=single_dir)
+    multi_index, single_index = load_index(multi_dir), load_index(single_dir)
+
+    assert sorted(multi_index) == sorted(single_index)
+    for recno in single_index:
+        for multi_name, single_name in zip(multi_index[recno]['names'],
+                                           single_index[recno]['names']):
+            assert np.array_equal(np.load(os.path.join(multi_dir, multi_name)),
+                                  np.load(os.path.join(single_dir, single_name)))
+
+
+def test_annotate_by_policy_and_max_seg_min(recordings_dir, tmp_path):
+    images_dir = str(tmp_path / 'images')
+    generate_rp_images_multi(recordings_dir, max_seg_mins=[10, 20], rp_params=RP_PARAMS,
+                             images_dir=images_dir)
+    index = load_index(images_dir)
+    group = {'train': {False: ['1001', '1002'], True: []}, 'valid': {False: [], True: ['1003']}}
+
+    results = annotate_train_valid_group(group, index, policy='late_valid', max_seg_min=20)
+    assert results['train'][False] == ['1001_late_valid_m20_d2_t1_p3.npy',
+                                       '1002_late_valid_m20_d2_t1_p3.npy']
+    assert results['valid'][True] == ['1003_late_valid_m20_d2_t1_p3.npy']
+
+
+def test_annotate_by_policy_requires_sources(recordings_dir, tmp_path):
+    images_dir = str(tmp_path / 'images')
+    generate_rp_images(recordings_dir, rp_params=RP_PARAMS, images_dir=images_dir)
+    group = {'train': {False: ['1001'], True: []}, 'valid': {False: [], True: []}}
+
+    assert annotate_train_valid_group(group, load_index(images_dir))['train'][False]
+    with pytest.raises(ValueError, match='sources'):
+        annotate_train_valid_group(group, load_index(images_dir), policy='early_valid')
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SRC_DIR
+
+
+# modules only needed for plotting, RP computation or reading signals, imported on first use
+HEAVY_MODULES = ['matplotlib', 'pyts', 'numba', 'wfdb', 'imageio', 'scipy.signal', 'scipy.spatial']
+
+# seconds, in addition to importing numpy
+IMPORT_BUDGET = {
+    'libRP': 0.2,
+    'basic_denoise': 0.2,
+    'ctg_utils': 0.2,
+    'compute_metadata': 0.2,
+    'resample': 0.2,
+    'generate_recurrence_images': 0.2,
+    'generate_rp_cli': 0.2,
+}
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+import numpy
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def measure_import(module):
+    """Import module in fresh interpreter, returning elapsed time and heavy modules loaded"""
+    script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', script], cwd=SRC_DIR, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', sorted(IMPORT_BUDGET))
+def test_import_budget(module):
+    result = measure_import(module)
+    assert result['loaded'] == []
+    assert result['elapsed'] < IMPORT_BUDGET[module]
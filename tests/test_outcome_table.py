@@ -0,0 +1,117 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from ctg_utils import OUTCOME_SCHEMA, build_outcome_table, load_outcome_table, parse_meta_comments
+from ctg_utils import read_header_comments
+from compute_metadata import split_recordings_by_outcome
+
+
+# comment block in the layout of CTU-UHB .hea files
+HEADER_COMMENTS = '''#----- Additional parameters for record {recno}
+#-- Outcome measures
+#pH           {ph}
+#BDecf        8.14
+#pCO2         7.7
+#BE           -10.5
+#Apgar1       6
+#Apgar5       8
+#-- Fetus/Neonate descriptors
+#Gest. weeks  37
+#Weight(g)    2660
+#Sex          2
+#-- Maternal (risk-)factors
+#Age          32
+#Gravidity    1
+#Parity       0
+#Diabetes     0
+#Hypertension 0
+#Preeclampsia 0
+#Liq. praecox 1
+#Pyrexia      0
+#Meconium     0
+#-- Delivery descriptors
+#Presentation 2
+#Induced      0
+#I.stage      400
+#NoProgress   0
+#CK/KP        0
+#II.stage     15
+#Deliv. type  1
+#dbID         1023779
+#Rec. type    1
+#Pos. II.st.  -1
+#Sig2Birth    -1
+'''
+
+PH = {'1001': 7.14, '1002': 7.30, '1003': 7.02, '1004': 7.25}
+
+
+@pytest.fixture
+def dbdir(tmp_path):
+    for recno, ph in PH.items():
+        with open(tmp_path / '{}.hea'.format(recno), 'w') as outfile:
+            outfile.write('{} 2 4 100\n'.format(recno))
+            outfile.write(HEADER_COMMENTS.format(recno=recno, ph=ph))
+    return str(tmp_path)
+
+
+def test_outcome_table_matches_parse_meta_comments(dbdir):
+    table = build_outcome_table(dbdir)
+    assert list(table['recno']) == sorted(PH)
+    for row in table:
+        meta = parse_meta_comments(read_header_comments(dbdir, row['recno']))
+        values = {k: v for section in meta.values() for k, v in section.items()}
+        for name, _ in OUTCOME_SCHEMA:
+            assert row[name] == values[name]
+
+
+def test_outcome_table_missing_schema_field(dbdir):
+    with pytest.raises(ValueError):
+        build_outcome_table(dbdir, schema=OUTCOME_SCHEMA + [('Liq.', 'i4')])
+
+
+def test_load_outcome_table_cached(dbdir, tmp_path):
+    cache_file = str(tmp_path / 'cache.npy')
+    table = load_outcome_table(dbdir, cache_file=cache_file)
+    assert np.array_equal(load_outcome_table(dbdir, cache_file=cache_file), table)
+
+
+def test_load_outcome_table_no_default_cache(dbdir):
+    files = sorted(os.listdir(dbdir))
+    assert list(load_outcome_table(dbdir)['recno']) == sorted(PH)
+    assert sorted(os.listdir(dbdir)) == files
+
+
+def test_load_outcome_table_stale_cache(dbdir, tmp_path_factory):
+    cache_file = str(tmp_path_factory.mktemp('cache') / 'cache.npy')
+    load_outcome_table(dbdir, cache_file=cache_file)
+
+    # same number of recordings, different recnos
+    os.rename(os.path.join(dbdir, '1004.hea'), os.path.join(dbdir, '1005.hea'))
+    assert list(load_outcome_table(dbdir, cache_file=cache_file)['recno'])[-1] == '1005'
+
+    # header edited after cache was written
+    fname = os.path.join(dbdir, '1001.hea')
+    with open(fname, 'r') as infile:
+        header = infile.read()
+    with open(fname, 'w') as outfile:
+        outfile.write(header.replace('7.14', '7.01'))
+    mtime = os.path.getmtime(cache_file) + 10
+    os.utime(fname, (mtime, mtime))
+    assert load_outcome_table(dbdir, cache_file=cache_file)['pH'][0] == 7.01
+
+
+def test_split_recordings_by_outcome_table(dbdir):
+    table = build_outcome_table(dbdir)
+    data = {recno: {'outcome': {'pH': ph}} for recno, ph in PH.items()}
+
+    random.seed(0)
+    expected = split_recordings_by_outcome(data, 7.15)
+    random.seed(0)
+    assert split_recordings_by_outcome(data, 7.15, outcome_table=table) == expected
+
+    with pytest.raises(ValueError):
+        split_recordings_by_outcome(dict(data, **{'9999': {}}), 7.15, outcome_table=table)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import scipy.signal
+
+from resample import decimate, decimate_batch
+
+
+def random_segments(lengths, seed=0):
+    rng = np.random.RandomState(seed)
+    return [None if n is None else 140 + np.cumsum(rng.normal(scale=0.5, size=n)) for n in lengths]
+
+
+@pytest.mark.parametrize('ftype', ['iir', 'fir'])
+@pytest.mark.parametrize('n_dec', [2, 4])
+def test_decimate_matches_scipy(ftype, n_dec):
+    x = random_segments([2400])[0]
+    assert np.array_equal(decimate(x, n_dec, ftype=ftype),
+                          scipy.signal.decimate(x, n_dec, ftype=ftype))
+
+
+@pytest.mark.parametrize('ftype', ['iir', 'fir'])
+def test_decimate_batch_matches_scipy(ftype):
+    segments = random_segments([2400, None, 1800, 2400, None, 2401])
+    results = decimate_batch(segments, 4, ftype=ftype)
+    assert len(results) == len(segments)
+    for seg, y in zip(segments, results):
+        if seg is None:
+            assert y is None
+        else:
+            assert np.array_equal(y, scipy.signal.decimate(seg, 4, ftype=ftype))
+
+
+def test_decimate_no_decimation():
+    x = random_segments([100])[0]
+    assert np.array_equal(decimate(x, 1), x)
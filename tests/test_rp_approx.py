@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from benchmark_rp import synthetic_hr, exact_dist
+from libRP import compute_rp, compute_rp_approx, mask_knn, rp_norm, rp_jaccard
+
+
+# minimum Jaccard agreement with exact plot, 'point' and 'percentage_points' use a sampled
+# estimate of the distance percentile so are not exact
+MIN_JACCARD = {'point': 0.95, 'percentage_points': 0.95, 'knn': 0.999, 'distance': 0.999}
+
+
+def exact_rp(segment, mode, percentage=3, knn=5, radius=2.0):
+    if mode == 'point':
+        return compute_rp(segment, percentage=percentage)
+    X_dist = exact_dist(segment)
+    if mode == 'percentage_points':
+        return rp_norm(X_dist[None], threshold='percentage_points', percentage=percentage)[0]
+    elif mode == 'knn':
+        return mask_knn(X_dist, k=knn, policy='cols')
+    return X_dist < radius
+
+
+def approx_rp(segment, mode, percentage=3, knn=5, radius=2.0):
+    if mode == 'knn':
+        return compute_rp_approx(segment, knn=knn)
+    elif mode == 'distance':
+        return compute_rp_approx(segment, threshold=radius)
+    return compute_rp_approx(segment, percentage=percentage, threshold=mode)
+
+
+@pytest.mark.parametrize('n', [600, 2400])
+@pytest.mark.parametrize('mode', sorted(MIN_JACCARD))
+def test_rp_approx_accuracy(mode, n):
+    segment = synthetic_hr(n, seed=n)
+    X_approx = approx_rp(segment, mode)
+    assert X_approx.shape == (n - 1, n - 1)
+    assert rp_jaccard(exact_rp(segment, mode), X_approx) >= MIN_JACCARD[mode]
+
+
+@pytest.mark.parametrize('mode', ['point', 'percentage_points', 'distance'])
+def test_rp_approx_symmetric(mode):
+    X_approx = approx_rp(synthetic_hr(600), mode)
+    assert (X_approx != X_approx.T).nnz == 0
+
+
+@pytest.mark.parametrize('threshold', ['distance', 'points', None, True])
+def test_rp_approx_invalid_threshold(threshold):
+    with pytest.raises(ValueError):
+        compute_rp_approx(synthetic_hr(100), threshold=threshold)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from conftest import SYNTHETIC_RECORDS
+from generate_recurrence_images import get_record_selected_hr
+from libRP import compute_rp
+from rp_dataset import RPDataset
+
+
+RP_PARAMS = [{'percentage': 3}, {'percentage': 10, 'suffix': 'png'}]
+
+
+@pytest.fixture(scope='module')
+def dataset(recordings_dir):
+    return RPDataset(recordings_dir, rp_params=RP_PARAMS, cache_size=4)
+
+
+def as_array(X):
+    return X.numpy() if hasattr(X, 'numpy') else X
+
+
+def test_dataset_items(dataset, recordings_dir):
+    assert len(dataset) == len(SYNTHETIC_RECORDS) * len(RP_PARAMS)
+    assert dataset.get_item_key(3) == ('1002', 1)
+    assert dataset.get_fname(3) == '1002_d2_t1_p10.jpg'
+
+    selected_hr, _ = get_record_selected_hr(recordings_dir, '1002')
+    assert np.allclose(dataset.segments['1002'], selected_hr)
+    assert np.array_equal(dataset.get_rp(3), compute_rp(selected_hr, percentage=10))
+
+
+def test_dataset_getitem(dataset):
+    X, y = dataset[0]
+    X = as_array(X)
+    n = len(dataset.segments['1001']) - 1
+    assert X.shape == (1, n, n)
+    assert X.dtype == np.float32
+    assert X.min() == 0 and X.max() == 1
+
+    X_last, _ = dataset[-1]
+    assert np.array_equal(as_array(X_last), as_array(dataset[len(dataset) - 1][0]))
+    with pytest.raises(IndexError):
+        dataset[len(dataset)]
+
+
+def test_dataset_labels(dataset):
+    for idx in range(len(dataset)):
+        recno, _ = dataset.get_item_key(idx)
+        ph, _ = SYNTHETIC_RECORDS[recno]
+        assert dataset[idx][1] == (1 if ph >= 7.15 else 0)
+
+
+def test_dataset_n_channels(recordings_dir):
+    dataset = RPDataset(recordings_dir, rp_params=RP_PARAMS[:1], n_channels=3, limit=2)
+    X = as_array(dataset[0][0])
+    assert X.shape[0] == 3
+    assert np.array_equal(X[0], X[2])
+
+
+def test_dataset_lru_cache(dataset):
+    dataset._cache.clear()
+    for idx in range(5):
+        dataset.get_rp(idx)
+    assert list(dataset._cache) == [dataset.get_item_key(idx) for idx in range(1, 5)]
+
+    dataset.get_rp(1)     # most recently used moves to end, next eviction drops item 2
+    dataset.get_rp(5)
+    assert list(dataset._cache) == [dataset.get_item_key(idx) for idx in [3, 4, 1, 5]]
+
+
+def test_dataset_prefetch(dataset):
+    dataset._cache.clear()
+    dataset.prefetch([0, 1, 2])
+    assert list(dataset._cache) == [dataset.get_item_key(idx) for idx in [0, 1, 2]]
+    assert np.array_equal(dataset._cache[dataset.get_item_key(2)], dataset.get_rp(2))
+
+
+def test_dataset_unknown_rp_params(recordings_dir):
+    with pytest.raises(ValueError):
+        RPDataset(recordings_dir, rp_params=[{'percentag': 3}])
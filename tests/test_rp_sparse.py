@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from benchmark_rp import synthetic_hr
+from libRP import (compute_rp, resize_rp, resize_rp_sparse, np_to_uint8, sparse_to_uint8,
+                   to_sparse_rp, rqa_sparse, save_rp)
+
+
+@pytest.mark.parametrize('percentage', [1, 3, 10])
+def test_sparse_rp_matches_dense(percentage):
+    segment = synthetic_hr(600)
+    X_dense = compute_rp(segment, percentage=percentage)
+    X_sparse = compute_rp(segment, percentage=percentage, sparse=True)
+    assert np.array_equal(X_dense.astype(bool), X_sparse.toarray())
+
+
+def test_sparse_rp_matches_dense_at_threshold_ties():
+    segment = 140 + np.cumsum(np.random.RandomState(3).normal(0, .5, 800))
+    X_dense = compute_rp(segment, percentage=10)
+    X_sparse = compute_rp(segment, percentage=10, sparse=True)
+    assert np.array_equal(X_dense.astype(bool), X_sparse.toarray())
+
+
+def test_sparse_knn_rp_matches_dense():
+    segment = synthetic_hr(600)
+    assert np.array_equal(compute_rp(segment, knn=5),
+                          compute_rp(segment, knn=5, sparse=True).toarray())
+
+
+@pytest.mark.parametrize('use_mean', [False, True])
+def test_resize_rp_sparse(use_mean):
+    X_dense = compute_rp(synthetic_hr(600), percentage=3)
+    assert np.allclose(resize_rp(X_dense, new_shape=64, use_mean=use_mean),
+                       resize_rp_sparse(to_sparse_rp(X_dense), new_shape=64, use_mean=use_mean))
+
+
+def test_sparse_to_uint8():
+    X_dense = compute_rp(synthetic_hr(600), percentage=3)
+    assert np.array_equal(np_to_uint8(X_dense), sparse_to_uint8(to_sparse_rp(X_dense)))
+
+
+@pytest.fixture
+def rqa_matrix():
+    """Line of identity, diagonal lines of length 3 either side, isolated symmetric pair"""
+    X = np.eye(6, dtype=bool)
+    for i in range(3):
+        X[i, i + 1] = X[i + 1, i] = True
+    X[0, 5] = X[5, 0] = True
+    return to_sparse_rp(X)
+
+
+def test_rqa_sparse(rqa_matrix):
+    rqa = rqa_sparse(rqa_matrix)
+    assert rqa['RR'] == pytest.approx(14 / 36)
+    assert rqa['DET'] == pytest.approx(6 / 8)
+    assert rqa['LAM'] == pytest.approx(10 / 14)
+    assert rqa['L'] == pytest.approx(3)
+    assert rqa['L_max'] == 3
+
+
+def test_rqa_sparse_include_loi(rqa_matrix):
+    rqa = rqa_sparse(rqa_matrix, exclude_loi=False)
+    assert rqa['DET'] == pytest.approx(12 / 14)
+    assert rqa['L'] == pytest.approx(4)
+    assert rqa['L_max'] == 6
+
+
+@pytest.mark.parametrize('use_clip', [False, True])
+def test_save_rp_npz_keeps_values(tmp_path, use_clip):
+    from scipy.sparse import load_npz
+    X_rp = compute_rp(synthetic_hr(200), percentage=3, use_clip=use_clip)
+    save_rp(X_rp, 'rp.npz', images_dir=str(tmp_path), suffix='npz')
+    assert np.array_equal(load_npz(str(tmp_path / 'rp.npz')).toarray(), X_rp)